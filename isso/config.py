@@ -82,7 +82,10 @@ class IssoParser(ConfigParser):
         * handle indented lines as "lists"
     """
 
-    def getint(self, section, key):
+    def getint(self, section, key, fallback=NotImplemented):
+        if fallback is not NotImplemented and not self.has_option(section, key):
+            return fallback
+
         try:
             delta = timedelta(self.get(section, key))
         except ValueError:
@@ -24,6 +24,9 @@ class SQLite3:
 
     MAX_VERSION = 3
 
+    # lowest SQLITE_MAX_VARIABLE_NUMBER across SQLite versions
+    MAX_VARIABLES = 999
+
     def __init__(self, path, conf):
 
         self.path = os.path.expanduser(path)
@@ -104,20 +107,28 @@ class SQLite3:
                     "SELECT id FROM comments WHERE parent IS NULL").fetchall())
                 flattened = defaultdict(set)
 
-                for id in top:
-
-                    ids = [id, ]
-
-                    while ids:
-                        rv = first(con.execute(
-                            "SELECT id FROM comments WHERE parent=?", (ids.pop(), )))
-                        ids.extend(rv)
-                        flattened[id].update(set(rv))
-
-                for id in flattened.keys():
-                    for n in flattened[id]:
-                        con.execute(
-                            "UPDATE comments SET parent=? WHERE id=?", (id, n))
+                # walk all trees breadth-first, one query per nesting level
+                # (and chunk of ids) rather than one query per comment
+                root = dict((id, id) for id in top)
+                ids = top
+
+                while ids:
+                    rv = []
+                    for i in range(0, len(ids), SQLite3.MAX_VARIABLES):
+                        chunk = ids[i:i + SQLite3.MAX_VARIABLES]
+                        rv.extend(con.execute(
+                            "SELECT id, parent FROM comments WHERE parent IN (%s)"
+                            % ", ".join("?" * len(chunk)), chunk).fetchall())
+
+                    ids = []
+                    for id, parent in rv:
+                        root[id] = root[parent]
+                        flattened[root[id]].add(id)
+                        ids.append(id)
+
+                con.executemany(
+                    "UPDATE comments SET parent=? WHERE id=?",
+                    ((id, n) for id in flattened for n in flattened[id]))
 
                 con.execute('PRAGMA user_version = 3')
                 logger.info("%i rows changed", con.total_changes)
@@ -19,14 +19,22 @@ class Threads(object):
             '    id INTEGER PRIMARY KEY, uri VARCHAR(256) UNIQUE, title VARCHAR(256))'])
 
     def __contains__(self, uri):
-        return self.db.execute("SELECT title FROM threads WHERE uri=?", (uri, )) \
-                      .fetchone() is not None
+        """Costs a query of its own, use :meth:`get_or_none` if the thread is
+        needed afterwards anyway."""
+        return self.get_or_none(uri) is not None
 
     def __getitem__(self, uri):
-        return Thread(*self.db.execute("SELECT * FROM threads WHERE uri=?", (uri, )).fetchone())
+        return Thread(*self.db.execute("SELECT id, uri, title FROM threads WHERE uri=?", (uri, )).fetchone())
 
     def get(self, id):
-        return Thread(*self.db.execute("SELECT * FROM threads WHERE id=?", (id, )).fetchone())
+        return Thread(*self.db.execute("SELECT id, uri, title FROM threads WHERE id=?", (id, )).fetchone())
+
+    def get_or_none(self, uri, cached=True):
+        """Return thread :param:`uri` or None.  :param:`cached` is accepted
+        for compatibility with the PostgreSQL backend, which caches threads."""
+        rv = self.db.execute(
+            "SELECT id, uri, title FROM threads WHERE uri=?", (uri, )).fetchone()
+        return Thread(*rv) if rv else None
 
     def new(self, uri, title):
         self.db.execute(
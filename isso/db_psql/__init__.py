@@ -1,11 +1,14 @@
 # -*- encoding: utf-8 -*-
 
-import psycopg2
+import functools
 import logging
 import operator
 import os.path
+import threading
+import uuid
 
-from collections import defaultdict
+from psycopg.sql import SQL, Identifier
+from psycopg_pool import ConnectionPool
 
 logger = logging.getLogger("isso")
 
@@ -15,24 +18,53 @@ from isso.db_psql.spam import Guard
 from isso.db_psql.preferences import Preferences
 
 
+@functools.lru_cache(maxsize=256)
+def _translate_cached(sql):
+    if isinstance(sql, tuple):
+        sql = ' '.join(sql)
+
+    return sql.replace('?', '%s')
+
+
+def _translate(sql):
+    """Join a list of SQL fragments and convert sqlite-style `?` placeholders
+    to psycopg's `%s`.  The conversion is memoized, as the same handful of
+    statements is issued over and over again; lists are keyed by their
+    fragments so that neither the join nor the replacement is repeated."""
+
+    if isinstance(sql, list):
+        sql = tuple(sql)
+
+    return _translate_cached(sql)
+
+
+_fetchone = operator.methodcaller("fetchone")
+_fetchall = operator.methodcaller("fetchall")
+_rowcount = operator.attrgetter("rowcount")
+
+
 class PSQL:
     """DB-dependend wrapper around PostgreSQL.
 
-    Runs migration if `user_version` is older than `MAX_VERSION` and register
-    a trigger for automated orphan removal.
+    Runs migration if the version stored in the `versions` table is older
+    than `MAX_VERSION` and register a trigger for automated orphan removal.
     """
 
-    MAX_VERSION = 3
+    MAX_VERSION = 4
+
+    # bind parameters per statement, limited by the wire protocol's int16
+    MAX_PARAMETERS = 65535
 
     def __init__(self, path, conf):
 
         self.path = os.path.expanduser(path)
         self.conf = conf
+        self._pool_lock = threading.Lock()
+        self._pool_pid = None
 
-        rv = self.execute([
+        rv = self.fetchone([
             "SELECT tablename AS name FROM pg_catalog.pg_tables"
-            "   WHERE tablename IN ('threads', 'comments', 'preferences')"]
-        ).fetchone()
+            "   WHERE tablename IN ('threads', 'comments', 'preferences')"])
 
         self.preferences = Preferences(self)
         self.threads = Threads(self)
@@ -40,99 +72,251 @@ class PSQL:
         self.guard = Guard(self)
 
         if rv is None:
+            with self._pool.connection() as con:
+                self.create_stale_threads_func_and_trigger(con.cursor())
             self.set_version(PSQL.MAX_VERSION)
         else:
             self.migrate(to=PSQL.MAX_VERSION)
 
-    def execute(self, sql, args=()):
-
-        if isinstance(sql, (list, tuple)):
-            sql = ' '.join(sql)
+        # uWSGI and gunicorn --preload fork their workers after this point,
+        # don't hand them our connections
+        self._pool.close()
+        self._pool_pid = None
 
-        sql = sql.replace('?', '%s')
-
-        with psycopg2.connect(self.path) as con:
+    @property
+    def _pool(self):
+        """The connection pool of the current process.
+
+        The pool is (re-)created on first use in every process: a forked child
+        shares the parent's sockets, but not the pool's worker threads.  An
+        inherited pool is dropped without closing it, which would terminate
+        the parent's connections.
+        """
+        if self._pool_pid != os.getpid():
+            with self._pool_lock:
+                if self._pool_pid != os.getpid():
+                    # statements executed more than five times on a connection
+                    # are turned into server-side prepared statements by psycopg
+                    self._pool_instance = ConnectionPool(
+                        self.path, min_size=1,
+                        max_size=self.conf.getint(
+                            "general", "db-pool-size", fallback=10),
+                        kwargs={"prepare_threshold": 5}, open=True)
+                    self._pool_pid = os.getpid()
+
+        return self._pool_instance
+
+    def fetchone(self, sql, args=()):
+        """Run :param:`sql` and return the first row or None."""
+        return self._execute(sql, args, _fetchone)
+
+    def fetchall(self, sql, args=()):
+        """Run :param:`sql` and return a list of all rows."""
+        return self._execute(sql, args, _fetchall)
+
+    def execute_void(self, sql, args=()):
+        """Run :param:`sql` for its side effects only."""
+        self._execute(sql, args, None)
+
+    def execute_rowcount(self, sql, args=()):
+        """Run :param:`sql` and return the number of affected rows."""
+        return self._execute(sql, args, _rowcount)
+
+    def executescript(self, statements, args=()):
+        """Run each of :param:`statements` on the same connection and commit
+        them as a single transaction.  A statement may itself be a list of
+        SQL fragments, as accepted by :meth:`fetchone` and friends.  The
+        statements are pipelined, i.e. sent to the server in a single
+        round-trip.
+        """
+        with self._pool.connection() as con, con.pipeline():
+            cursor = con.cursor()
+            for sql in statements:
+                cursor.execute(_translate(sql), args)
+
+    def executemany_fast(self, sql, seq_of_params):
+        """Run :param:`sql` once for every item of :param:`seq_of_params`.
+        psycopg pipelines the statements, so this costs a single round-trip.
+        """
+        with self._pool.connection() as con:
+            con.cursor().executemany(_translate(sql), seq_of_params)
+
+    def execute_values(self, sql, argslist, page_size=1000):
+        """Insert or update many rows with few statements, like psycopg2's
+        :func:`execute_values`.  The single placeholder in :param:`sql` is
+        replaced by a multi-row ``VALUES`` list of up to :param:`page_size`
+        items of :param:`argslist` at a time.  All pages run in one
+        transaction; rows returned by a ``RETURNING`` clause are collected
+        and returned.
+
+        Pages are shrunk as needed to stay within PostgreSQL's limit of
+        65535 bind parameters per statement.
+        """
+        parts = _translate(sql).split('%s')
+        if len(parts) != 2:
+            raise ValueError("execute_values: expected exactly one placeholder "
+                             "in %r, found %i" % (sql, len(parts) - 1))
+
+        head, tail = parts
+        argslist = list(argslist)
+        rv = []
+
+        if not argslist:
+            return rv
+
+        if not argslist[0]:
+            raise ValueError("execute_values: rows must not be empty")
+
+        page_size = max(1, min(
+            page_size, PSQL.MAX_PARAMETERS // len(argslist[0])))
+
+        with self._pool.connection() as con:
             cursor = con.cursor()
-            cursor.execute(sql, args)
-            return cursor
+            for i in range(0, len(argslist), page_size):
+                page = argslist[i:i + page_size]
+                values = ', '.join(
+                    '(' + ', '.join(['%s'] * len(args)) + ')' for args in page)
+                cursor.execute(head + values + tail,
+                               [arg for args in page for arg in args])
+                if cursor.description is not None:
+                    rv.extend(cursor.fetchall())
+
+        return rv
+
+    def bulk_update_via_copy(self, table, key_col, value_col, rows):
+        """Set :param:`value_col` of :param:`table` for many rows at once and
+        return the number of updated rows.
+
+        :param:`rows` is an iterable of ``(key, value)`` pairs with integer
+        keys and bytes-like values.  They are streamed into a temporary table
+        using binary COPY, so blobs such as the voters bloomfilter are sent
+        as-is instead of being hex-encoded, and applied with one UPDATE.
+        """
+        # ON COMMIT DROP scopes the table to this transaction, the unique name
+        # keeps it apart from any other temporary table of the session
+        tmp = Identifier("bulk_update_%s" % uuid.uuid4().hex)
+
+        with self._pool.connection() as con:
+            cursor = con.cursor()
+            cursor.execute(SQL(
+                'CREATE TEMP TABLE {} (k INTEGER, v BYTEA) ON COMMIT DROP').format(tmp))
+            with cursor.copy(SQL(
+                    'COPY {} FROM STDIN (FORMAT BINARY)').format(tmp)) as copy:
+                copy.set_types(['int4', 'bytea'])
+                for row in rows:
+                    copy.write_row(row)
+            cursor.execute(SQL(
+                'UPDATE {table} SET {value} = {tmp}.v FROM {tmp} '
+                'WHERE {table}.{key} = {tmp}.k').format(
+                    table=Identifier(table), value=Identifier(value_col),
+                    key=Identifier(key_col), tmp=tmp))
+            return cursor.rowcount
+
+    def _execute(self, sql, args, fetch):
+
+        # this runs for nearly every query, hence the explicit getconn/putconn
+        # rather than the (slower) pool.connection() context manager
+        con = self._pool.getconn()
+        try:
+            cursor = con.execute(_translate(sql), args)
+            rv = None if fetch is None else fetch(cursor)
+            con.commit()
+        except Exception:
+            con.rollback()
+            raise
+        finally:
+            self._pool.putconn(con)
+
+        return rv
 
     @property
     def version(self):
-        return self.execute("SELECT MAX(version) FROM versions").fetchone()[0]
+        return self.fetchone("SELECT MAX(version) FROM versions")[0]
 
     def set_version(self, version):
-        self.execute('CREATE TABLE IF NOT EXISTS versions (version INTEGER)')
-        self.execute("INSERT INTO versions VALUES (%i)" % version)
-
-    def create_stale_threads_func_and_trigger(self):
-        #NOTE: these are not safe for multiple workers in parallel
-        #XXX TODO: we need to call these once per installation somehow
-        self.execute([
-            'CREATE or REPLACE FUNCTION remove_stale_threads_func() RETURNS trigger AS $remove_stale_threads_func$',
-            'BEGIN',
-            '   DELETE FROM threads WHERE id NOT IN (SELECT tid FROM comments);',
-            '   RETURN NULL;',
-            'END',
-            '$remove_stale_threads_func$ LANGUAGE plpgsql'
-        ])
-
-        self.execute([
-            'DROP TRIGGER IF EXISTS remove_stale_threads ON comments;',
-            'CREATE TRIGGER remove_stale_threads',
-            'AFTER DELETE ON comments',
-            'EXECUTE PROCEDURE remove_stale_threads_func()'])
+        self.execute_void('CREATE TABLE IF NOT EXISTS versions (version INTEGER)')
+        self.execute_void("INSERT INTO versions VALUES (%i)" % version)
+
+    def create_stale_threads_func_and_trigger(self, cursor):
+        """Install a trigger that removes threads whose last comment has been
+        deleted.  Runs once per database, either for a new schema or as part
+        of the migration to version 4."""
+        for sql in (
+            [
+                'CREATE or REPLACE FUNCTION remove_stale_threads_func() RETURNS trigger AS $remove_stale_threads_func$',
+                'BEGIN',
+                '   DELETE FROM threads t WHERE t.id IN (SELECT DISTINCT tid FROM dropped)',
+                '       AND NOT EXISTS (SELECT 1 FROM comments c WHERE c.tid = t.id);',
+                '   RETURN NULL;',
+                'END',
+                '$remove_stale_threads_func$ LANGUAGE plpgsql'
+            ],
+            'DROP TRIGGER IF EXISTS remove_stale_threads ON comments',
+            [
+                'CREATE TRIGGER remove_stale_threads',
+                'AFTER DELETE ON comments',
+                'REFERENCING OLD TABLE AS dropped',
+                'FOR EACH STATEMENT',
+                'EXECUTE PROCEDURE remove_stale_threads_func()'
+            ]):
+            cursor.execute(_translate(sql))
 
     def migrate(self, to):
 
-        if self.version >= to:
+        version = self.version
+        if version >= to:
             return
 
-        logger.info("migrate database from version %i to %i", self.version, to)
-
-        # re-initialize voters blob due a bug in the bloomfilter signature
-        # which added older commenter's ip addresses to the current voters blob
-        if self.version == 0:
+        logger.info("migrate database from version %i to %i", version, to)
 
-            from isso.utils import Bloomfilter
-            bf = buffer(Bloomfilter(iterable=["127.0.0.0"]).array)
+        # all steps share a single transaction, a failing step rolls back the
+        # whole migration
+        with self._pool.connection() as con:
+            cursor = con.cursor()
 
-            with psycopg2.connect(self.path) as con:
-                con.cursor().execute('UPDATE comments SET voters=?', (bf, ))
-                con.cursor().execute('INSERT INTO versions VALUES (1)')
-                logger.info("%i rows changed", con.total_changes)
+            # re-initialize voters blob due a bug in the bloomfilter signature
+            # which added older commenter's ip addresses to the current voters blob
+            if version == 0:
 
-        # move [general] session-key to database
-        if self.version == 1:
+                from isso.utils import Bloomfilter
+                bf = bytes(Bloomfilter(iterable=["127.0.0.0"]).array)
 
-            with psycopg2.connect(self.path) as con:
-                if self.conf.has_option("general", "session-key"):
-                    con.cursor().execute('UPDATE preferences SET value=? WHERE key=?', (
-                        self.conf.get("general", "session-key"), "session-key"))
+                cursor.execute('UPDATE comments SET voters=%s', (bf, ))
+                logger.info("%i rows changed", cursor.rowcount)
 
-                con.cursor().execute('INSERT INTO versions VALUES (2)')
-                logger.info("%i rows changed", con.total_changes)
+                cursor.execute('INSERT INTO versions VALUES (1)')
+                version = 1
 
-        # limit max. nesting level to 1
-        if self.version == 2:
+            # move [general] session-key to database
+            if version == 1:
 
-            first = lambda rv: list(map(operator.itemgetter(0), rv))
+                if self.conf.has_option("general", "session-key"):
+                    cursor.execute('UPDATE preferences SET value=%s WHERE key=%s', (
+                        self.conf.get("general", "session-key"), "session-key"))
+                    logger.info("%i rows changed", cursor.rowcount)
 
-            with psycopg2.connect(self.path) as con:
-                top = first(con.cursor().execute("SELECT id FROM comments WHERE parent IS NULL").fetchall())
-                flattened = defaultdict(set)
+                cursor.execute('INSERT INTO versions VALUES (2)')
+                version = 2
 
-                for id in top:
+            # limit max. nesting level to 1
+            if version == 2:
 
-                    ids = [id, ]
+                # re-parent every reply to the top-level comment of its tree
+                cursor.execute(' '.join([
+                    'WITH RECURSIVE tree AS (',
+                    '    SELECT id, id AS root FROM comments WHERE parent IS NULL',
+                    '    UNION ALL',
+                    '    SELECT c.id, t.root FROM comments c JOIN tree t ON c.parent = t.id',
+                    ')',
+                    'UPDATE comments SET parent = tree.root FROM tree',
+                    'WHERE comments.id = tree.id AND comments.parent <> tree.root']))
+                logger.info("%i rows changed", cursor.rowcount)
 
-                    while ids:
-                        rv = first(con.cursor().execute("SELECT id FROM comments WHERE parent=?", (ids.pop(), )))
-                        ids.extend(rv)
-                        flattened[id].update(set(rv))
+                cursor.execute('INSERT INTO versions VALUES (3)')
+                version = 3
 
-                for id in flattened.keys():
-                    for n in flattened[id]:
-                        con.cursor().execute("UPDATE comments SET parent=? WHERE id=?", (id, n))
+            # remove threads without comments, as the SQLite backend does
+            if version == 3:
 
-                con.cursor().execute('INSERT INTO versions VALUES (3)')
-                logger.info("%i rows changed", con.total_changes)
+                self.create_stale_threads_func_and_trigger(cursor)
+                cursor.execute('INSERT INTO versions VALUES (4)')
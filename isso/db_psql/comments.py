@@ -34,13 +34,18 @@ class Comments:
     def __init__(self, db):
 
         self.db = db
-        self.db.execute([
+        self.db.execute_void([
             'CREATE TABLE IF NOT EXISTS comments (',
             '    tid INTEGER REFERENCES threads(id), id SERIAL PRIMARY KEY, parent INTEGER,',
             '    created FLOAT NOT NULL, modified FLOAT, mode INTEGER, remote_addr VARCHAR,',
             '    text VARCHAR, author VARCHAR, email VARCHAR, website VARCHAR,',
             '    likes INTEGER DEFAULT 0, dislikes INTEGER DEFAULT 0, voters bytea NOT NULL,',
             '    notification INTEGER DEFAULT 0);'])
+        # tid backs the remove_stale_threads trigger (see
+        # PSQL.create_stale_threads_func_and_trigger), parent the reply lookups
+        self.db.executescript([
+            'CREATE INDEX IF NOT EXISTS idx_comments_tid ON comments(tid)',
+            'CREATE INDEX IF NOT EXISTS idx_comments_parent ON comments(parent)'])
         #try:
         #    self.db.execute(['ALTER TABLE comments ADD COLUMN notification INTEGER DEFAULT 0;'])
         #except Exception:
@@ -57,7 +62,7 @@ class Comments:
             if ref.get("parent") is not None:
                 c["parent"] = ref["parent"]
 
-        self.db.execute([
+        self.db.execute_void([
             'INSERT INTO comments (',
             '    tid, parent,'
             '    created, modified, mode, remote_addr,',
@@ -74,15 +79,15 @@ class Comments:
             uri)
         )
 
-        return dict(zip(Comments.fields, self.db.execute(
+        return dict(zip(Comments.fields, self.db.fetchone(
             'SELECT * FROM comments AS c INNER JOIN threads ON threads.uri = ? ORDER BY c.id DESC limit 1',
-            (uri, )).fetchone()))
+            (uri, ))))
 
     def activate(self, id):
         """
         Activate comment id if pending.
         """
-        self.db.execute([
+        self.db.execute_void([
             'UPDATE comments SET',
             '    mode=1',
             'WHERE id=? AND mode=2'], (id, ))
@@ -97,11 +102,11 @@ class Comments:
             # search for any activated comments within the last 6 months by email
             # this SQL should be one of the fastest ways of doing this check
             # https://stackoverflow.com/questions/18114458/fastest-way-to-determine-if-record-exists
-            rv = self.db.execute([
+            rv = self.db.fetchone([
                 'SELECT CASE WHEN EXISTS(',
                 '    select * from comments where email=? and mode=1 and ',
                 '    created > strftime("%s", DATETIME("now", "-6 month"))',
-                ') THEN 1 ELSE 0 END;'], (email,)).fetchone()
+                ') THEN 1 ELSE 0 END;'], (email,))
             return rv[0] == 1
         else:
             return False
@@ -110,7 +115,7 @@ class Comments:
         """
         Turn off email notifications for replies to this comment.
         """
-        self.db.execute([
+        self.db.execute_void([
             'UPDATE comments SET',
             '    notification=0',
             'WHERE email=? AND (id=? OR parent=?);'], (email, id, id))
@@ -120,7 +125,7 @@ class Comments:
         Update comment :param:`id` with values from :param:`data` and return
         updated comment.
         """
-        self.db.execute([
+        self.db.execute_void([
             'UPDATE comments SET',
             ','.join(key + '=' + '?' for key in data),
             'WHERE id=?;'],
@@ -133,8 +138,8 @@ class Comments:
         Search for comment :param:`id` and return a mapping of :attr:`fields`
         and values.
         """
-        rv = self.db.execute(
-            'SELECT * FROM comments WHERE id=?', (id, )).fetchone()
+        rv = self.db.fetchone(
+            'SELECT * FROM comments WHERE id=?', (id, ))
         if rv:
             return dict(zip(Comments.fields, rv))
 
@@ -144,9 +149,9 @@ class Comments:
         """
         Return comment mode counts for admin
         """
-        comment_count = self.db.execute(
+        comment_count = self.db.fetchall(
             'SELECT mode, COUNT(comments.id) FROM comments '
-            'GROUP BY comments.mode').fetchall()
+            'GROUP BY comments.mode')
         return dict(comment_count)
 
     def fetchall(self, mode=5, after=0, parent='any', order_by='id',
@@ -195,7 +200,7 @@ class Comments:
             #sql_args.append(page * limit)
             #sql_args.append(limit)
 
-        rv = self.db.execute(sql, sql_args).fetchall()
+        rv = self.db.fetchall(sql, sql_args)
         for item in rv:
             yield dict(zip(fields_comments + fields_threads, item))
 
@@ -229,7 +234,7 @@ class Comments:
             sql.append('LIMIT ?')
             sql_args.append(limit)
 
-        rv = self.db.execute(sql, sql_args).fetchall()
+        rv = self.db.fetchall(sql, sql_args)
         for item in rv:
             yield dict(zip(Comments.fields, item))
 
@@ -245,9 +250,13 @@ class Comments:
                '            comments',
                '        WHERE parent IS NOT NULL)')
 
-        while self.db.execute(sql).rowcount:
+        while self.db.execute_rowcount(sql):
             continue
 
+        # deleted comments may have taken their thread along, see
+        # PSQL.create_stale_threads_func_and_trigger
+        self.db.threads.forget()
+
     def delete(self, id):
         """
         Delete a comment. There are two distinctions: a comment is referenced
@@ -259,19 +268,19 @@ class Comments:
         In the second case this comment can be safely removed without any side
         effects."""
 
-        refs = self.db.execute(
-            'SELECT * FROM comments WHERE parent=?', (id, )).fetchone()
+        refs = self.db.fetchone(
+            'SELECT * FROM comments WHERE parent=?', (id, ))
 
         if refs is None:
-            self.db.execute('DELETE FROM comments WHERE id=?', (id, ))
+            self.db.execute_void('DELETE FROM comments WHERE id=?', (id, ))
             self._remove_stale()
             return None
 
-        self.db.execute('UPDATE comments SET text=? WHERE id=?', ('', id))
-        self.db.execute('UPDATE comments SET mode=? WHERE id=?', (4, id))
+        self.db.execute_void('UPDATE comments SET text=? WHERE id=?', ('', id))
+        self.db.execute_void('UPDATE comments SET mode=? WHERE id=?', (4, id))
         for field in ('author', 'website'):
-            self.db.execute('UPDATE comments SET %s=? WHERE id=?' %
-                            field, (None, id))
+            self.db.execute_void('UPDATE comments SET %s=? WHERE id=?' %
+                                 field, (None, id))
 
         self._remove_stale()
         return self.get(id)
@@ -281,9 +290,8 @@ class Comments:
         the creater can't vote on his/her own comment and multiple votes from the
         same ip address are ignored as well)."""
 
-        rv = self.db.execute(
-            'SELECT likes, dislikes, voters FROM comments WHERE id=?', (id, )) \
-            .fetchone()
+        rv = self.db.fetchone(
+            'SELECT likes, dislikes, voters FROM comments WHERE id=?', (id, ))
 
         if rv is None:
             return None
@@ -302,10 +310,10 @@ class Comments:
             return {'likes': likes, 'dislikes': dislikes, 'message': message}
 
         bf.add(remote_addr)
-        self.db.execute([
+        self.db.execute_void([
             'UPDATE comments SET',
             '    likes = likes + 1,' if upvote else 'dislikes = dislikes + 1,',
-            '    voters = ?'
+            '    voters = ?',
             'WHERE id=?;'], (memoryview(bf.array), id))
 
         if upvote:
@@ -324,18 +332,18 @@ class Comments:
                '   comments.created > ?',
                'GROUP BY comments.parent']
 
-        return dict(self.db.execute(sql, [url, mode, mode, after]).fetchall())
+        return dict(self.db.fetchall(sql, [url, mode, mode, after]))
 
     def count(self, *urls):
         """
         Return comment count for one ore more urls..
         """
 
-        threads = dict(self.db.execute([
+        threads = dict(self.db.fetchall([
             'SELECT threads.uri, COUNT(comments.id) FROM comments',
             'LEFT OUTER JOIN threads ON threads.id = tid AND comments.mode = 1',
             'GROUP BY threads.uri'
-        ]).fetchall())
+        ]))
 
         return [threads.get(url, 0) for url in urls]
 
@@ -343,7 +351,7 @@ class Comments:
         """
         Remove comments older than :param:`delta`.
         """
-        self.db.execute([
+        self.db.execute_void([
             'DELETE FROM comments WHERE mode = 2 AND ? - created > ?;'
         ], (time.time(), delta))
         self._remove_stale()
@@ -13,7 +13,7 @@ class Preferences:
     def __init__(self, db):
 
         self.db = db
-        self.db.execute([
+        self.db.execute_void([
             'CREATE TABLE IF NOT EXISTS preferences (',
             '   key VARCHAR PRIMARY KEY, value VARCHAR',
             ');'])
@@ -23,8 +23,8 @@ class Preferences:
                 self.set(key, value)
 
     def get(self, key, default=None):
-        rv = self.db.execute(
-                'SELECT value FROM preferences WHERE key=?', (key, )).fetchone()
+        rv = self.db.fetchone(
+                'SELECT value FROM preferences WHERE key=?', (key, ))
 
         if rv is None:
             return default
@@ -32,5 +32,5 @@ class Preferences:
         return rv[0]
 
     def set(self, key, value):
-        self.db.execute(
+        self.db.execute_void(
             'INSERT INTO preferences (key, value) VALUES (?, ?)', (key, value))
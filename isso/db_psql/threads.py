@@ -1,33 +1,132 @@
 # -*- encoding: utf-8 -*-
 
+import time
 
-def Thread(id, uri, title):
-    return {
-        "id": id,
-        "uri": uri,
-        "title": title
-    }
+from collections import namedtuple
+
+
+class Thread(namedtuple("Thread", "id uri title")):
+    """Lightweight thread record.  Supports the read-only mapping access that
+    views and extensions use with the SQLite backend's dicts: ``thread["uri"]``,
+    ``thread.get("title")``, ``thread.keys()`` and ``"uri" in thread``.
+
+    It is still a tuple, though: iterating over it (or serializing it as
+    JSON) yields the values, not the keys.  Use ``thread._asdict()`` where a
+    real dict is needed.
+    """
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            if key not in self._fields:
+                raise KeyError(key)
+            key = self._fields.index(key)
+        return super(Thread, self).__getitem__(key)
+
+    def __contains__(self, key):
+        return key in self._fields
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self._fields else default
+
+    def keys(self):
+        return self._fields
 
 
 class Threads(object):
+    """Threads rarely change once created, so lookups by uri and id are kept
+    in a small in-process cache.  New and updated threads are written through
+    to it; removals by the stale threads trigger go unnoticed by other worker
+    processes until the entry expires.
+
+    The cache maps ``("uri", uri)`` and ``("id", id)`` to ``(expires, thread)``.
+    """
+
+    # two entries (by uri and by id) per thread, i.e. up to 1024 threads
+    CACHE_THRESHOLD = 2048
+    CACHE_TIMEOUT = 60
 
     def __init__(self, db):
 
         self.db = db
-        self.db.execute([
+        self.cache = {}
+        self.db.execute_void([
             'CREATE TABLE IF NOT EXISTS threads (',
             '    id SERIAL PRIMARY KEY, uri VARCHAR(256) UNIQUE, title VARCHAR(256))'])
 
     def __contains__(self, uri):
-        return self.db.execute("SELECT title FROM threads WHERE uri=?", (uri, )) \
-                      .fetchone() is not None
+        """Costs a query of its own on a cache miss, use :meth:`get_or_none`
+        if the thread is needed afterwards anyway."""
+        return self.get_or_none(uri) is not None
 
     def __getitem__(self, uri):
-        return Thread(*self.db.execute("SELECT * FROM threads WHERE uri=?", (uri, )).fetchone())
+        rv = self.get_or_none(uri)
+        if rv is None:
+            raise KeyError(uri)
+        return rv
+
+    def get_or_none(self, uri, cached=True):
+        """Return thread :param:`uri` or None.  Pass ``cached=False`` where a
+        thread removed by another process must not be mistaken for an existing
+        one, e.g. before adding a comment to it."""
+        rv = self._lookup(("uri", uri)) if cached else None
+        if rv is None:
+            rv = self.db.fetchone("SELECT id, uri, title FROM threads WHERE uri=?", (uri, ))
+            if rv is None:
+                return None
+            rv = self._remember(Thread(*rv))
+        return rv
 
     def new(self, uri, title):
-        self.db.execute("INSERT INTO threads (uri, title) VALUES (?, ?)", (uri, title))
-        return self[uri]
-    
+        return self._remember(Thread(*self.db.fetchone(
+            "INSERT INTO threads (uri, title) VALUES (?, ?) RETURNING id, uri, title",
+            (uri, title))))
+
+    def upsert(self, uri, title):
+        """Create thread :param:`uri` or update its title if it already
+        exists, atomically and in a single round-trip."""
+        return self._remember(Thread(*self.db.fetchone([
+            "INSERT INTO threads (uri, title) VALUES (?, ?)",
+            "ON CONFLICT (uri) DO UPDATE SET title = EXCLUDED.title",
+            "RETURNING id, uri, title"], (uri, title))))
+
+    def new_many(self, rows):
+        """Create a thread for every ``(uri, title)`` pair in :param:`rows`
+        using multi-row INSERTs, skipping uris that already exist.  Returns
+        the newly created threads."""
+        return [self._remember(Thread(*rv)) for rv in self.db.execute_values([
+            "INSERT INTO threads (uri, title) VALUES ?",
+            "ON CONFLICT (uri) DO NOTHING RETURNING id, uri, title"], rows)]
+
     def get(self, tid: int):
-        return Thread(*self.db.execute("SELECT * FROM threads WHERE id=?", (str(tid), )).fetchone())
+        rv = self._lookup(("id", int(tid)))
+        if rv is None:
+            rv = self._remember(Thread(*self.db.fetchone(
+                "SELECT id, uri, title FROM threads WHERE id=?", (int(tid), ))))
+        return rv
+
+    def forget(self):
+        """Drop all cached threads, e.g. after comments have been deleted and
+        the trigger may have removed their thread."""
+        self.cache.clear()
+
+    def _lookup(self, key):
+        entry = self.cache.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def _remember(self, thread):
+        now = time.monotonic()
+        if len(self.cache) >= Threads.CACHE_THRESHOLD:
+            for key, (expires, _) in list(self.cache.items()):
+                if expires < now:
+                    self.cache.pop(key, None)
+            if len(self.cache) >= Threads.CACHE_THRESHOLD:
+                self.cache.clear()
+
+        entry = (now + Threads.CACHE_TIMEOUT, thread)
+        self.cache[("uri", thread.uri)] = entry
+        self.cache[("id", thread.id)] = entry
+        return thread
@@ -26,3 +26,7 @@ class TestConfig(unittest.TestCase):
         self.assertEqual(parser.getlist("foo", "spam"), ['a', 'b', 'cdef'])
         self.assertEqual(list(parser.getiter("foo", "bla")), ['spam', 'ham'])
         self.assertEqual(list(parser.getiter("foo", "asd")), ['fgh'])
+
+        self.assertEqual(parser.getint("foo", "baz", fallback=1), 12)
+        self.assertEqual(parser.getint("foo", "missing", fallback=1), 1)
+        self.assertEqual(parser.getint("missing", "baz", fallback=1), 1)
@@ -1,5 +1,6 @@
 # -*- encoding: utf-8 -*-
 
+import contextlib
 import unittest
 import os
 import sqlite3
@@ -7,6 +8,89 @@ import tempfile
 
 from isso import config
 from isso.db import SQLite3
+from isso.db_psql import PSQL
+from isso.db_psql.comments import Comments as PSQLComments
+from isso.db_psql.threads import Thread, Threads as PSQLThreads
+
+
+class StubPSQL(object):
+    """Answers every :meth:`fetchone` with the next row of :attr:`rows` and
+    records the statements it is given."""
+
+    def __init__(self, *rows):
+        self.rows = list(rows)
+        self.queries = []
+        self.threads = PSQLThreads(self)
+        self.queries = []
+
+    def fetchone(self, sql, args=()):
+        self.queries.append((sql, args))
+        return self.rows.pop(0) if self.rows else None
+
+    def execute_void(self, sql, args=()):
+        self.queries.append((sql, args))
+
+    def execute_rowcount(self, sql, args=()):
+        self.queries.append((sql, args))
+        return 0
+
+    def executescript(self, statements, args=()):
+        self.queries.extend((sql, args) for sql in statements)
+
+
+class StubCursor(object):
+    """Records the statements it is given.  A statement with a RETURNING
+    clause returns the pool's :attr:`rows`, or else its parameters in pairs."""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.description = None
+
+    def execute(self, sql, args=()):
+        self.pool.statements.append((sql, args))
+        self.rows = self.pool.rows if self.pool.rows is not None else [
+            tuple(args[i:i + 2]) for i in range(0, len(args), 2)]
+        self.description = [] if "RETURNING" in sql else None
+        return self
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+
+class StubPool(object):
+
+    def __init__(self):
+        self.statements = []
+        self.rows = None
+
+    def cursor(self):
+        return StubCursor(self)
+
+    def execute(self, sql, args=()):
+        return self.cursor().execute(sql, args)
+
+    def commit(self):
+        pass
+
+    @contextlib.contextmanager
+    def connection(self):
+        yield self
+
+    def getconn(self):
+        return self
+
+    def putconn(self, con):
+        pass
+
+
+def stub_psql():
+    db = PSQL.__new__(PSQL)
+    db._pool_pid = os.getpid()
+    db._pool_instance = StubPool()
+    return db
 
 
 class TestDBMigration(unittest.TestCase):
@@ -118,3 +202,201 @@ class TestDBMigration(unittest.TestCase):
             rv = con.execute(
                 "SELECT id, parent FROM comments ORDER BY created").fetchall()
             self.assertEqual(flattened, rv)
+
+
+class TestThreads(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        conf = config.new({
+            "general": {
+                "dbpath": "/dev/null",
+                "max-age": "1h"
+            }
+        })
+        self.db = SQLite3(self.path, conf)
+
+    def tearDown(self):
+        os.unlink(self.path)
+
+    def test_get_or_none(self):
+
+        self.assertIsNone(self.db.threads.get_or_none("/"))
+        self.assertNotIn("/", self.db.threads)
+
+        self.db.threads.new("/", "Test")
+
+        self.assertEqual(self.db.threads.get_or_none("/"),
+                         {"id": 1, "uri": "/", "title": "Test"})
+        self.assertIn("/", self.db.threads)
+        self.assertIsNone(self.db.threads.get_or_none("/other"))
+        self.assertNotIn("/other", self.db.threads)
+
+
+class TestPSQLThread(unittest.TestCase):
+
+    def test_mapping_access(self):
+
+        thread = Thread(1, "/", "Test")
+
+        self.assertEqual(thread["uri"], "/")
+        self.assertEqual(thread.get("title"), "Test")
+        self.assertIsNone(thread.get("missing"))
+        self.assertIn("id", thread)
+        self.assertNotIn("missing", thread)
+        self.assertEqual(list(thread.keys()), ["id", "uri", "title"])
+        self.assertEqual(thread._asdict(), {"id": 1, "uri": "/", "title": "Test"})
+        self.assertRaises(KeyError, lambda: thread["missing"])
+
+    def test_tuple_access(self):
+
+        thread = Thread(1, "/", "Test")
+
+        self.assertEqual(thread.title, "Test")
+        self.assertEqual(thread[0], 1)
+        self.assertEqual(tuple(thread), (1, "/", "Test"))
+
+
+class TestPSQLThreadsCache(unittest.TestCase):
+
+    def test_write_through(self):
+
+        db = StubPSQL((1, "/", "Test"), (1, "/", "Renamed"))
+
+        thread = db.threads.new("/", "Test")
+        db.queries = []
+
+        self.assertEqual(db.threads.get_or_none("/"), thread)
+        self.assertEqual(db.threads.get(1), thread)
+        self.assertEqual(db.queries, [])
+
+        db.threads.upsert("/", "Renamed")
+        db.queries = []
+
+        self.assertEqual(db.threads.get_or_none("/").title, "Renamed")
+        self.assertEqual(db.threads.get(1).title, "Renamed")
+        self.assertEqual(db.queries, [])
+
+    def test_bypass(self):
+
+        db = StubPSQL((1, "/", "Test"))
+        db.threads.new("/", "Test")
+
+        self.assertIsNone(db.threads.get_or_none("/", cached=False))
+        self.assertEqual(len(db.queries), 2)
+
+    def test_id_keys(self):
+
+        db = StubPSQL((1, "/", "Test"))
+
+        self.assertEqual(db.threads.get("1"), db.threads.get(1))
+        self.assertEqual(len(db.queries), 1)
+
+    def test_expiry(self):
+
+        db = StubPSQL((1, "/", "Test"), (1, "/", "Renamed"))
+        db.threads.new("/", "Test")
+
+        for key, (expires, thread) in db.threads.cache.items():
+            db.threads.cache[key] = (expires - PSQLThreads.CACHE_TIMEOUT - 1, thread)
+
+        self.assertEqual(db.threads.get_or_none("/").title, "Renamed")
+
+    def test_threshold(self):
+
+        db = StubPSQL(*[(i, "/%i" % i, "") for i in range(1025)])
+        for i in range(1025):
+            db.threads.new("/%i" % i, "")
+
+        self.assertLessEqual(len(db.threads.cache), PSQLThreads.CACHE_THRESHOLD)
+        self.assertEqual(db.threads.get_or_none("/1024").id, 1024)
+
+    def test_forget_after_delete(self):
+
+        db = StubPSQL((1, "/", "Test"))
+        comments = PSQLComments(db)
+
+        db.threads.new("/", "Test")
+        comments.delete(1)
+        db.queries = []
+
+        self.assertIsNone(db.threads.get_or_none("/"))
+        self.assertEqual(len(db.queries), 1)
+
+    def test_forget_after_purge(self):
+
+        db = StubPSQL((1, "/", "Test"))
+        comments = PSQLComments(db)
+
+        db.threads.new("/", "Test")
+        comments.purge(3600)
+        db.queries = []
+
+        self.assertIsNone(db.threads.get_or_none("/"))
+        self.assertEqual(len(db.queries), 1)
+
+
+class TestPSQLExecuteValues(unittest.TestCase):
+
+    def setUp(self):
+        self.db = stub_psql()
+        self.statements = self.db._pool.statements
+
+    def test_pages(self):
+
+        rows = [(i, str(i)) for i in range(2500)]
+        self.assertEqual(self.db.execute_values("INSERT INTO t VALUES ?", rows), [])
+
+        self.assertEqual(len(self.statements), 3)
+        self.assertEqual([len(args) for _, args in self.statements],
+                         [2000, 2000, 1000])
+        self.assertTrue(self.statements[0][0].startswith(
+            "INSERT INTO t VALUES (%s, %s), (%s, %s)"))
+        self.assertEqual(self.statements[2][1][-2:], [2499, "2499"])
+
+    def test_parameter_limit(self):
+
+        rows = [tuple(range(100))] * 1000
+        self.db.execute_values("INSERT INTO t VALUES ?", rows)
+
+        # 65535 // 100
+        self.assertEqual([len(args) // 100 for _, args in self.statements],
+                         [655, 345])
+
+    def test_placeholders(self):
+
+        self.assertRaises(ValueError, self.db.execute_values,
+                          "INSERT INTO t VALUES", [(1, 2)])
+        self.assertRaises(ValueError, self.db.execute_values,
+                          "INSERT INTO t VALUES ? WHERE x = ?", [(1, 2)])
+        self.assertRaises(ValueError, self.db.execute_values,
+                          "INSERT INTO t VALUES ?", [()])
+        self.assertEqual(self.statements, [])
+
+    def test_empty(self):
+
+        self.assertEqual(self.db.execute_values("INSERT INTO t VALUES ?", []), [])
+        self.assertEqual(self.db.execute_values("INSERT INTO t VALUES ?", iter([])), [])
+        self.assertEqual(self.statements, [])
+
+    def test_returning(self):
+
+        rv = self.db.execute_values(
+            "INSERT INTO t VALUES ? RETURNING a, b", [(1, 2), (3, 4)])
+
+        self.assertEqual(rv, [(1, 2), (3, 4)])
+
+    def test_new_many(self):
+
+        threads = PSQLThreads(self.db)
+        del self.statements[:]
+        self.db._pool.rows = [(1, "/a", "A"), (2, "/b", "B")]
+
+        rv = threads.new_many([("/a", "A"), ("/b", "B")])
+
+        self.assertEqual(len(self.statements), 1)
+        self.assertEqual(len(rv), 2)
+        for thread in rv:
+            self.assertIs(threads.get_or_none(thread.uri), thread)
+            self.assertIs(threads.get(thread.id), thread)
+        self.assertEqual(len(self.statements), 1)
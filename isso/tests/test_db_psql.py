@@ -0,0 +1,214 @@
+# -*- encoding: utf-8 -*-
+
+"""Integration tests for the PostgreSQL backend.
+
+They need a disposable database and are skipped unless its DSN is given in
+``ISSO_TEST_PSQL_DSN``, e.g. ``postgresql://isso@localhost/isso_test``.
+Every test drops isso's tables first, don't point this at a live database.
+"""
+
+import os
+import unittest
+
+from isso import config
+from isso.utils import Bloomfilter
+
+DSN = os.environ.get("ISSO_TEST_PSQL_DSN")
+
+if DSN:
+    import psycopg
+    from isso.db_psql import PSQL
+
+
+def drop_all():
+    with psycopg.connect(DSN) as con:
+        con.execute("DROP TABLE IF EXISTS"
+                    "    comments, threads, preferences, versions CASCADE")
+        con.execute("DROP FUNCTION IF EXISTS remove_stale_threads_func()")
+
+
+def query(sql, args=()):
+    with psycopg.connect(DSN) as con:
+        return con.execute(sql, args).fetchall()
+
+
+def comment(**kwargs):
+    rv = {"text": "Lorem ipsum ...", "mode": 1, "remote_addr": "192.168.1.1"}
+    rv.update(kwargs)
+    return rv
+
+
+@unittest.skipUnless(DSN, "ISSO_TEST_PSQL_DSN not set")
+class PSQLTestCase(unittest.TestCase):
+
+    def setUp(self):
+        drop_all()
+        self.conf = config.new({
+            "general": {
+                "dbpath": "/dev/null",
+                "max-age": "1h"
+            }
+        })
+
+    def tearDown(self):
+        drop_all()
+
+
+class TestPSQLMigration(PSQLTestCase):
+
+    def test_defaults(self):
+
+        db = PSQL(DSN, self.conf)
+
+        self.assertEqual(db.version, PSQL.MAX_VERSION)
+        self.assertTrue(db.preferences.get("session-key", "").isalnum())
+        self.assertEqual(query(
+            "SELECT tgname FROM pg_trigger WHERE tgname = 'remove_stale_threads'"),
+            [("remove_stale_threads", )])
+
+    def test_migrate_from_version_0(self):
+
+        tree = {
+            1: None,
+            2: None,
+            3: 2,
+            4: 3,
+            7: 3,
+            5: 2,
+            6: None
+        }
+
+        PSQL(DSN, self.conf)
+
+        with psycopg.connect(DSN) as con:
+            con.execute("DELETE FROM versions")
+            con.execute("INSERT INTO versions VALUES (0)")
+            con.execute("DROP TRIGGER remove_stale_threads ON comments")
+
+            con.execute(
+                "INSERT INTO threads (uri, title) VALUES (%s, %s)", ("/", "Test"))
+            for (id, parent) in tree.items():
+                con.execute("INSERT INTO comments ("
+                            "    tid, id, parent, created, voters)"
+                            "VALUES (1, %s, %s, %s, %s)", (id, parent, id, b"x"))
+
+        db = PSQL(DSN, self.conf)
+
+        self.assertEqual(db.version, PSQL.MAX_VERSION)
+
+        flattened = list({
+            1: None,
+            2: None,
+            3: 2,
+            4: 2,
+            5: 2,
+            6: None,
+            7: 2
+        }.items())
+
+        self.assertEqual(
+            query("SELECT id, parent FROM comments ORDER BY created"), flattened)
+        self.assertEqual(
+            query("SELECT DISTINCT voters FROM comments"),
+            [(bytes(Bloomfilter(iterable=["127.0.0.0"]).array), )])
+        self.assertEqual(query(
+            "SELECT tgname FROM pg_trigger WHERE tgname = 'remove_stale_threads'"),
+            [("remove_stale_threads", )])
+
+
+class TestPSQLThreads(PSQLTestCase):
+
+    def setUp(self):
+        super(TestPSQLThreads, self).setUp()
+        self.db = PSQL(DSN, self.conf)
+
+    def test_get_or_none(self):
+
+        self.assertIsNone(self.db.threads.get_or_none("/"))
+        self.assertNotIn("/", self.db.threads)
+
+        thread = self.db.threads.new("/", "Test")
+
+        self.assertEqual(self.db.threads.get_or_none("/"), thread)
+        self.assertEqual(thread.uri, "/")
+        self.assertEqual(thread.title, "Test")
+        self.assertIn("/", self.db.threads)
+        self.assertEqual(self.db.threads.get(thread.id), thread)
+
+    def test_upsert(self):
+
+        thread = self.db.threads.upsert("/", "Test")
+        self.assertEqual(thread.title, "Test")
+
+        updated = self.db.threads.upsert("/", "Renamed")
+        self.assertEqual(updated.id, thread.id)
+        self.assertEqual(updated.title, "Renamed")
+        self.assertEqual(query("SELECT title FROM threads"), [("Renamed", )])
+
+    def test_new_many(self):
+
+        self.db.threads.new("/0", "Existing")
+
+        rv = self.db.threads.new_many(
+            [("/%i" % i, "Thread %i" % i) for i in range(2500)])
+
+        self.assertEqual(len(rv), 2499)
+        self.assertEqual(sorted(t.uri for t in rv),
+                         sorted("/%i" % i for i in range(1, 2500)))
+        self.assertEqual(query("SELECT COUNT(*) FROM threads"), [(2500, )])
+        self.assertEqual(self.db.threads.new_many([]), [])
+
+    def test_remove_stale_thread(self):
+
+        self.db.threads.new("/", "Test")
+        self.db.threads.new("/other", "Other")
+        a = self.db.comments.add("/", comment())
+        b = self.db.comments.add("/", comment())
+        self.db.comments.add("/other", comment())
+
+        self.db.comments.delete(a["id"])
+        self.assertIn("/", self.db.threads)
+
+        self.db.comments.delete(b["id"])
+        self.assertNotIn("/", self.db.threads)
+        self.assertIn("/other", self.db.threads)
+        self.assertEqual(query("SELECT uri FROM threads"), [("/other", )])
+
+
+class TestPSQLComments(PSQLTestCase):
+
+    def setUp(self):
+        super(TestPSQLComments, self).setUp()
+        self.db = PSQL(DSN, self.conf)
+        self.db.threads.new("/", "Test")
+
+    def test_vote(self):
+
+        c = self.db.comments.add("/", comment())
+
+        self.assertEqual(self.db.comments.vote(True, c["id"], "1.2.3.4"),
+                         {"likes": 1, "dislikes": 0})
+        self.assertEqual(self.db.comments.vote(False, c["id"], "1.2.3.5"),
+                         {"likes": 1, "dislikes": 1})
+        self.assertIn("message", self.db.comments.vote(True, c["id"], "1.2.3.4"))
+
+    def test_bulk_update_via_copy(self):
+
+        a = self.db.comments.add("/", comment())
+        b = self.db.comments.add("/", comment())
+        c = self.db.comments.add("/", comment())
+
+        rv = self.db.bulk_update_via_copy(
+            "comments", "id", "voters", [(a["id"], b"\x00\x01"), (b["id"], b"\xff")])
+
+        self.assertEqual(rv, 2)
+        self.assertEqual(
+            query("SELECT id, voters FROM comments ORDER BY id"),
+            [(a["id"], b"\x00\x01"), (b["id"], b"\xff"), (c["id"], c["voters"])])
+
+        # identifiers are quoted, not interpolated
+        self.assertRaises(psycopg.errors.UndefinedColumn,
+                          self.db.bulk_update_via_copy,
+                          "comments", "id", "voters = NULL --", [(c["id"], b"")])
+        self.assertEqual(query("SELECT voters FROM comments WHERE id = %s",
+                               (c["id"], )), [(c["voters"], )])
@@ -276,7 +276,10 @@ class API(object):
         data['remote_addr'] = self._remote_addr(request)
 
         with self.isso.lock:
-            if uri not in self.threads:
+            # bypass the thread cache, a stale entry would let the comment
+            # go to a thread that no longer exists
+            thread = self.threads.get_or_none(uri, cached=False)
+            if thread is None:
                 if 'title' not in data:
                     with http.curl('GET', local("origin"), uri) as resp:
                         if resp and resp.status == 200:
@@ -288,8 +291,6 @@ class API(object):
 
                 thread = self.threads.new(uri, title)
                 self.signal("comments.new:new-thread", thread)
-            else:
-                thread = self.threads[uri]
 
         # notify extensions that the new comment is about to save
         self.signal("comments.new:before-save", thread, data)
@@ -6,12 +6,13 @@ import sys
 from setuptools import setup, find_packages
 
 requires = ['itsdangerous', 'Jinja2', 'misaka>=2.0,<3.0', 'html5lib',
-            'werkzeug>=1.0', 'bleach', 'flask-caching>=1.9', 'psycopg2==2.9.3']
+            'werkzeug>=1.0', 'bleach', 'flask-caching>=1.9',
+            'psycopg[binary,pool]>=3.1']
 
 if sys.version_info < (3, ):
     raise SystemExit("Python 2 is not supported.")
-elif (3, 0) <= sys.version_info < (3, 5):
-    raise SystemExit("Python 3 versions < 3.5 are not supported.")
+elif (3, 0) <= sys.version_info < (3, 7):
+    raise SystemExit("Python 3 versions < 3.7 are not supported.")
 
 setup(
     name='isso',
@@ -30,11 +31,10 @@ setup(
         "Topic :: Internet :: WWW/HTTP :: HTTP Servers",
         "Topic :: Internet :: WWW/HTTP :: WSGI :: Application",
         "License :: OSI Approved :: MIT License",
-        "Programming Language :: Python :: 3.5",
-        "Programming Language :: Python :: 3.6",
         "Programming Language :: Python :: 3.7",
         "Programming Language :: Python :: 3.8"
     ],
+    python_requires='>=3.7',
     install_requires=requires,
     setup_requires=["cffi>=1.3.0"],
     entry_points={